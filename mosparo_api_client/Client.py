@@ -1,47 +1,280 @@
+import heapq
+import itertools
 import json
+import socket
+import threading
+import time
 import requests
 from datetime import date
+from http.cookiejar import DefaultCookiePolicy
+from requests.adapters import HTTPAdapter
+from urllib3.util import Timeout
 
+from .FormSchema import FormSchema
 from .RequestHelper import RequestHelper
+from .RequestProfiler import RequestProfiler
 from .VerificationResult import VerificationResult
 from .StatisticResult import StatisticResult
 from .MosparoException import MosparoException
+from .MosparoConnectionException import MosparoConnectionException
+from .MosparoResponseTooLargeException import MosparoResponseTooLargeException
+from .MosparoTimeoutException import MosparoTimeoutException
+from .ReplayGuard import ReplayGuard
+
+class _DeadlineWatchdog:
+    """
+    Calls the scheduled callbacks when their deadline has passed. One daemon thread serves all clients, so a request
+    with a deadline does not start its own thread. The callbacks are called while the lock is held, so they have to
+    return quickly.
+    """
+
+    def __init__(self) -> None:
+        self._condition = threading.Condition()
+        self._entries = []
+        self._counter = itertools.count()
+        self._thread = None
+
+    def schedule(self, deadline: float, callback) -> list:
+        """
+        Schedules the callback for the given deadline.
+
+        :param float deadline: The monotonic time at which the callback is called
+        :param callable callback: The callback without arguments
+        :return: The entry which can be cancelled
+        :rtype: list
+        """
+        entry = [deadline, next(self._counter), callback]
+
+        with self._condition:
+            heapq.heappush(self._entries, entry)
+
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='mosparo-deadline-watchdog', daemon=True)
+                self._thread.start()
+
+            if self._entries[0] is entry:
+                self._condition.notify()
+
+        return entry
+
+    def cancel(self, entry: list) -> None:
+        """
+        Cancels the scheduled callback. The callbacks are called while the lock is held, so after this method
+        returned, the callback is not called anymore, even if its deadline has just passed.
+
+        :param list entry: The entry which was returned by `schedule`
+        """
+        with self._condition:
+            entry[2] = None
+
+    def _run(self) -> None:
+        """
+        Waits for the next deadline and calls its callback. Cancelled entries are discarded as soon as they are
+        the next entry.
+        """
+        with self._condition:
+            while True:
+                if not self._entries:
+                    self._condition.wait()
+                    continue
+
+                remaining = self._entries[0][0] - time.monotonic()
+                if remaining > 0 and self._entries[0][2] is not None:
+                    self._condition.wait(remaining)
+                    continue
+
+                callback = heapq.heappop(self._entries)[2]
+                if callback is not None:
+                    callback()
+
+_deadline_watchdog = _DeadlineWatchdog()
 
 class Client:
     """
     The client is needed to communicate with the mosparo installation.
 
+    The configuration of the client cannot be changed after the initialization and one client can be shared between
+    threads. Every thread uses its own session, but all sessions share the same connection pool.
+
     :param str host: The host of the mosparo installation
     :param str public_key: The public key of the mosparo project
     :param str private_key: The private key of the mosparo project
     :param bool verify_ssl: Set to False, if the SSL certificate should not be verified.
+    :param int max_response_size: The maximum size of a response from mosparo in bytes
+    :param ReplayGuard replay_guard: Optional replay guard to answer repeated submit tokens without a request
+    :param RequestProfiler profiler: Optional profiler which collects metrics about the preparation of the form data
+    :param int pool_size: The maximum number of connections to mosparo which are kept open
     """
 
+    VERIFICATION_ENDPOINT: str = '/api/v1/verification/verify'
+    DEFAULT_MAX_RESPONSE_SIZE: int = 1048576
+    RESPONSE_CHUNK_SIZE: int = 8192
+    DEFAULT_POOL_SIZE: int = 10
+
     host: str = ''
     public_key: str = ''
     private_key: str = ''
     verify_ssl: bool = True
-
-    def __init__(self, host: str, public_key: str, private_key: str, verify_ssl=True):
+    max_response_size: int = DEFAULT_MAX_RESPONSE_SIZE
+    replay_guard: ReplayGuard = None
+    profiler: RequestProfiler = None
+    pool_size: int = DEFAULT_POOL_SIZE
+
+    def __init__(self, host: str, public_key: str, private_key: str, verify_ssl=True,
+                 max_response_size: int = DEFAULT_MAX_RESPONSE_SIZE, replay_guard: ReplayGuard = None,
+                 profiler: RequestProfiler = None, pool_size: int = DEFAULT_POOL_SIZE):
         self.host = host
         self.public_key = public_key
         self.private_key = private_key
         self.verify_ssl = verify_ssl
+        self.max_response_size = max_response_size
+        self.replay_guard = replay_guard
+        self.profiler = profiler
+        self.pool_size = pool_size
+
+        self._adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self._local = threading.local()
+        self._form_schemas = {}
+        self._form_schemas_lock = threading.Lock()
+        self._configured = True
+
+    def __setattr__(self, name: str, value) -> None:
+        """
+        Prevents changes of the configuration after the initialization.
+
+        :raises AttributeError: if a configuration attribute is changed after the initialization
+        """
+        if not name.startswith('_') and getattr(self, '_configured', False):
+            raise AttributeError('The configuration of the client cannot be changed after the initialization.')
+
+        super().__setattr__(name, value)
+
+    def register_form_schema(self, sample_form_data: dict) -> FormSchema:
+        """
+        Compiles a form schema from a sample submission of a form. Every following submission with the same fields
+        is prepared with the form schema. Submissions which do not match the form schema are prepared as before.
+
+        The form schemas are looked up by the top-level field names, so only one form schema can be registered for
+        the same top-level fields.
+
+        :param dict sample_form_data: A sample submission of the form
+        :return: The compiled FormSchema object
+        :rtype: FormSchema
+        :raises MosparoException: if the sample cannot be compiled to a form schema or a form schema with the same
+            top-level fields but different nested fields is already registered
+        """
+        form_schema = FormSchema(sample_form_data)
+
+        with self._form_schemas_lock:
+            registered_form_schema = self._form_schemas.get(form_schema.key)
+            if registered_form_schema is not None and not registered_form_schema.has_same_fields(form_schema):
+                raise MosparoException('A form schema with the same fields but a different structure is already '
+                                       'registered.')
+
+            form_schemas = dict(self._form_schemas)
+            form_schemas[form_schema.key] = form_schema
+            self._form_schemas = form_schemas
+
+        return form_schema
 
     def verify_submission(self, form_data: dict, submit_token: str = None,
-                          validation_token: str = None) -> VerificationResult:
+                          validation_token: str = None, timeout_budget: float = None) -> VerificationResult:
         """
         Verifies the given form data with mosparo.
 
         :param dict form_data: The dictionary with all the form data.
         :param str submit_token: The submit token which was submitted with the form
         :param str validation_token: The validation token which was submitted with the form
+        :param float timeout_budget: The number of seconds the whole verification is allowed to take. The remaining
+            time is shared by connecting and waiting for the response; while the response is read, the connection
+            is shut down at the deadline. Only a server which sends the response headers very slowly can exceed it.
         :return: A VerificationResult object
         :rtype: VerificationResult
         :raises MosparoException: if an error occurred
+        :raises MosparoTimeoutException: if the verification could not be completed within the time budget
+        """
+        deadline = None
+        if timeout_budget is not None:
+            deadline = time.monotonic() + timeout_budget
+
+        submit_token, validation_token = self.get_tokens(form_data, submit_token, validation_token)
+
+        if self.replay_guard is not None:
+            replayed_result = self.replay_guard.lookup(submit_token, validation_token)
+            if replayed_result is not None:
+                return replayed_result
+
+        request_data, request_signature, verification_signature = self.prepare_verification(
+            form_data,
+            submit_token,
+            validation_token
+        )
+
+        res = self.send_verification(request_data, request_signature, deadline)
+        result = self.create_verification_result(res, verification_signature)
+
+        # Errors returned by mosparo can be temporary, so only the final outcome of the verification is remembered
+        if self.replay_guard is not None and not ('error' in res and res['error']):
+            self.replay_guard.remember(submit_token, validation_token, result)
+
+        return result
+
+    def get_statistic_by_date(self, range: int = 0, start_date: date = None) -> StatisticResult:
+        """
+        Returns the statistic data, grouped by date.
+
+        :param int range: Time range in seconds (will be rounded up to a full day since mosparo v1.1)
+        :param datetime.date start_date: The start date from which the statistics are to be returned (requires mosparo v1.1)
+        :return: A StatisticResult object
+        :rtype: StatisticResult
+        :raises MosparoException: if an error occurred or was returned from mosparo
         """
         request_helper = RequestHelper(self.public_key, self.private_key)
 
+        api_endpoint = '/api/v1/statistic/by-date'
+        query_data = {}
+        if range > 0:
+            query_data['range'] = range
+
+        if start_date is not None:
+            query_data['startDate'] = start_date.strftime('%Y-%m-%d')
+
+        request_signature = request_helper.create_hmac_hash(api_endpoint + request_helper.to_json(query_data))
+
+        data = {
+            'auth': (self.public_key, request_signature),
+            'headers': {
+                'Accept': 'application/json'
+            },
+            'data': query_data
+        }
+
+        res = self._send_request('GET', api_endpoint, data)
+
+        if 'error' in res:
+            error_message = 'An error occurred in the connection to mosparo.'
+            if 'errorMessage' in res:
+                error_message = res['errorMessage']
+
+            raise MosparoException(error_message)
+
+        return StatisticResult(
+            res['data']['numberOfValidSubmissions'],
+            res['data']['numberOfSpamSubmissions'],
+            res['data']['numbersByDate']
+        )
+
+    def get_tokens(self, form_data: dict, submit_token: str = None, validation_token: str = None) -> tuple:
+        """
+        Returns the submit and validation token, either from the arguments or from the form data.
+
+        :param dict form_data: The dictionary with all the form data.
+        :param str submit_token: The submit token which was submitted with the form
+        :param str validation_token: The validation token which was submitted with the form
+        :return: A tuple with the submit and the validation token
+        :rtype: tuple
+        :raises MosparoException: if one of the tokens is not available
+        """
         if submit_token is None and '_mosparo_submitToken' in form_data:
             submit_token = form_data['_mosparo_submitToken']
 
@@ -51,21 +284,61 @@ class Client:
         if submit_token is None or validation_token is None:
             raise MosparoException('Submit or validation token not available.')
 
-        form_data = request_helper.prepare_form_data(form_data)
-        form_signature = request_helper.create_form_data_hmac_hash(form_data)
+        return submit_token, validation_token
+
+    def prepare_verification(self, form_data: dict, submit_token: str, validation_token: str) -> tuple:
+        """
+        Prepares and signs the verification request for the given form data. Together with `get_tokens`,
+        `send_verification` and `create_verification_result`, these are the steps of `verify_submission`, so that a
+        verification can be prepared now and sent later, like in the verification queue.
+
+        :param dict form_data: The dictionary with all the form data.
+        :param str submit_token: The submit token which was submitted with the form
+        :param str validation_token: The validation token which was submitted with the form
+        :return: A tuple with the request data, the request signature and the expected verification signature
+        :rtype: tuple
+        """
+        request_helper = RequestHelper(self.public_key, self.private_key, form_schemas=self._form_schemas)
+
+        # The verification is sampled as a whole, so that one record contains all the metrics of the verification
+        record = None
+        if self.profiler is not None and self.profiler.should_sample('verify_submission'):
+            record = self.profiler.create_record('verify_submission')
+            start = time.perf_counter()
+
+        form_data = request_helper.prepare_form_data(form_data, record)
+        form_signature = request_helper.create_form_data_hmac_hash(form_data, record)
 
         validation_signature = request_helper.create_hmac_hash(validation_token)
         verification_signature = request_helper.create_hmac_hash(validation_signature + form_signature)
 
-        api_endpoint = '/api/v1/verification/verify'
         request_data = {
             'submitToken': submit_token,
             'validationSignature': validation_signature,
             'formSignature': form_signature,
             'formData': form_data
         }
-        request_signature = request_helper.create_hmac_hash(api_endpoint + request_helper.to_json(request_data))
+        request_signature = request_helper.create_hmac_hash(
+            self.VERIFICATION_ENDPOINT + request_helper.to_json(request_data)
+        )
+
+        if record is not None:
+            record['total_time'] = time.perf_counter() - start
+            self.profiler.add_record(record)
+
+        return request_data, request_signature, verification_signature
+
+    def send_verification(self, request_data: dict, request_signature: str, deadline: float = None) -> dict:
+        """
+        Sends the prepared verification request to mosparo. The replay guard is not used.
 
+        :param dict request_data: The prepared request data
+        :param str request_signature: The signature of the request
+        :param float deadline: The monotonic time until which the request has to be completed
+        :return: The data which the API returned
+        :rtype: dict
+        :raises MosparoException: if an error occurred
+        """
         data = {
             'auth': (self.public_key, request_signature),
             'headers': {
@@ -75,8 +348,17 @@ class Client:
             'data': request_data
         }
 
-        res = self._send_request('POST', api_endpoint, data)
+        return self._send_request('POST', self.VERIFICATION_ENDPOINT, data, deadline)
+
+    def create_verification_result(self, res: dict, verification_signature: str) -> VerificationResult:
+        """
+        Creates the result from the data which mosparo returned for the verification request.
 
+        :param dict res: The data which the API returned
+        :param str verification_signature: The verification signature which mosparo has to return
+        :return: A VerificationResult object
+        :rtype: VerificationResult
+        """
         is_submittable = False
         is_valid = False
 
@@ -104,81 +386,167 @@ class Client:
             issues
         )
 
-    def get_statistic_by_date(self, range: int = 0, start_date: date = None) -> StatisticResult:
+    def _get_session(self) -> requests.Session:
         """
-        Returns the statistic data, grouped by date.
+        Returns the session of the current thread. The sessions of all threads share the connection pool of the client,
+        so the connections to mosparo stay open between the requests. Cookies are not stored, so every request is
+        sent without state.
 
-        :param int range: Time range in seconds (will be rounded up to a full day since mosparo v1.1)
-        :param datetime.date start_date: The start date from which the statistics are to be returned (requires mosparo v1.1)
-        :return: A StatisticResult object
-        :rtype: StatisticResult
-        :raises MosparoException: if an error occurred or was returned from mosparo
+        :return: The session
+        :rtype: requests.Session
         """
-        request_helper = RequestHelper(self.public_key, self.private_key)
-
-        api_endpoint = '/api/v1/statistic/by-date'
-        query_data = {}
-        if range > 0:
-            query_data['range'] = range
-
-        if start_date is not None:
-            query_data['startDate'] = start_date.strftime('%Y-%m-%d')
-
-        request_signature = request_helper.create_hmac_hash(api_endpoint + request_helper.to_json(query_data))
-
-        data = {
-            'auth': (self.public_key, request_signature),
-            'headers': {
-                'Accept': 'application/json'
-            },
-            'data': query_data
-        }
-
-        res = self._send_request('GET', api_endpoint, data)
-
-        if 'error' in res:
-            error_message = 'An error occurred in the connection to mosparo.'
-            if 'errorMessage' in res:
-                error_message = res['errorMessage']
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+            session.mount('http://', self._adapter)
+            session.mount('https://', self._adapter)
 
-            raise MosparoException(error_message)
+            self._local.session = session
 
-        return StatisticResult(
-            res['data']['numberOfValidSubmissions'],
-            res['data']['numberOfSpamSubmissions'],
-            res['data']['numbersByDate']
-        )
+        return session
 
-    def _send_request(self, method: str, uri: str, data: dict) -> dict:
+    def _send_request(self, method: str, uri: str, data: dict, deadline: float = None) -> dict:
         """
         Sends the request to mosparo and parses the response.
 
         :param str method: The method which is used (GET or POST)
         :param str uri: The URI of the API endpoint
         :param dict data: The data which needs to be sent to the API
+        :param float deadline: The monotonic time until which the request has to be completed
         :return: The data which the API returned
         :rtype: dict
-        :raises MosparoException: if an error occurred while sending the request to mosparo
-        :raises MosparoException: if the response from mosparo is empty
+        :raises MosparoConnectionException: if an error occurred while sending the request to mosparo or mosparo
+            responded with a server error
+        :raises MosparoException: if the response from mosparo is empty or invalid
+        :raises MosparoResponseTooLargeException: if the response from mosparo exceeds the maximum response size
+        :raises MosparoTimeoutException: if the request could not be completed before the deadline
         """
+        timeout = None
+        if deadline is not None:
+            timeout = Timeout(total=self._get_remaining_time(deadline))
+
+        session = self._get_session()
+
         req = None
         try:
             if method == 'GET':
-                req = requests.get(self.host + uri,
-                                   params=data['data'],
+                req = session.get(self.host + uri,
+                                  params=data['data'],
+                                  auth=data['auth'],
+                                  headers=data['headers'],
+                                  verify=self.verify_ssl,
+                                  timeout=timeout,
+                                  stream=True)
+            elif method == 'POST':
+                req = session.post(self.host + uri,
+                                   data=json.dumps(data['data']),
                                    auth=data['auth'],
                                    headers=data['headers'],
-                                   verify=self.verify_ssl)
-            elif method == 'POST':
-                req = requests.post(self.host + uri,
-                                    data=json.dumps(data['data']),
-                                    auth=data['auth'],
-                                    headers=data['headers'],
-                                    verify=self.verify_ssl)
+                                   verify=self.verify_ssl,
+                                   timeout=timeout,
+                                   stream=True)
+        except requests.Timeout as exc:
+            raise MosparoTimeoutException('The request to mosparo timed out.') from exc
         except Exception as exc:
-            raise MosparoException('An error occurred while sending the request to mosparo.') from exc
+            raise MosparoConnectionException('An error occurred while sending the request to mosparo.') from exc
 
-        if req and not req.text:
+        if req is None:
             raise MosparoException('Response from API invalid.')
 
-        return req.json()
+        # A server error usually comes from a proxy in front of mosparo during an outage, so it is handled like an
+        # unreachable mosparo instead of an invalid response.
+        if req.status_code >= 500:
+            req.close()
+            raise MosparoConnectionException('mosparo is not available (HTTP status %d).' % req.status_code)
+
+        # The read timeout applies to every single socket read and one read of a chunk can consist of many socket
+        # reads, so shrinking the timeout does not stop a slowly sent response. Instead, the connection is shut down
+        # at the deadline by a watchdog thread which is shared by all requests.
+        deadline_entry = None
+        if deadline is not None:
+            deadline_entry = _deadline_watchdog.schedule(deadline, lambda: self._abort_response(req))
+
+        try:
+            body = self._read_response_body(req, deadline)
+        finally:
+            if deadline_entry is not None:
+                _deadline_watchdog.cancel(deadline_entry)
+
+            req.close()
+
+        if deadline is not None and time.monotonic() >= deadline:
+            raise MosparoTimeoutException('The request to mosparo timed out.')
+
+        if not body:
+            raise MosparoException('Response from API invalid.')
+
+        try:
+            return json.loads(body)
+        except ValueError as exc:
+            raise MosparoException('Response from API invalid.') from exc
+
+    def _read_response_body(self, req: requests.Response, deadline: float = None) -> bytearray:
+        """
+        Reads the body of the streamed response and stops as soon as the maximum response size is exceeded
+        or the deadline has passed.
+
+        :param requests.Response req: The streamed response
+        :param float deadline: The monotonic time until which the response has to be read
+        :return: The raw body of the response
+        :rtype: bytearray
+        :raises MosparoConnectionException: if an error occurred while reading the response from mosparo
+        :raises MosparoResponseTooLargeException: if the response exceeds the maximum response size
+        :raises MosparoTimeoutException: if the response could not be read before the deadline
+        """
+        content_length = req.headers.get('Content-Length')
+        if content_length is not None and content_length.isdigit() and int(content_length) > self.max_response_size:
+            raise MosparoResponseTooLargeException('Response from API exceeds the maximum response size.')
+
+        body = bytearray()
+        try:
+            for chunk in req.iter_content(chunk_size=self.RESPONSE_CHUNK_SIZE):
+                body.extend(chunk)
+
+                if len(body) > self.max_response_size:
+                    raise MosparoResponseTooLargeException('Response from API exceeds the maximum response size.')
+
+                if deadline is not None:
+                    self._get_remaining_time(deadline)
+        except requests.RequestException as exc:
+            if deadline is not None and time.monotonic() >= deadline:
+                raise MosparoTimeoutException('The request to mosparo timed out.') from exc
+
+            raise MosparoConnectionException('An error occurred while sending the request to mosparo.') from exc
+
+        return body
+
+    def _abort_response(self, req: requests.Response) -> None:
+        """
+        Shuts down the connection of the given response, so that a blocked read returns immediately.
+
+        :param requests.Response req: The streamed response
+        """
+        sock = getattr(getattr(req.raw, 'connection', None), 'sock', None)
+        if sock is None:
+            return
+
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def _get_remaining_time(self, deadline: float) -> float:
+        """
+        Returns the number of seconds which are left until the deadline.
+
+        :param float deadline: The monotonic time of the deadline
+        :return: The remaining time in seconds
+        :rtype: float
+        :raises MosparoTimeoutException: if the deadline has passed
+        """
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise MosparoTimeoutException('The request to mosparo timed out.')
+
+        return remaining
@@ -0,0 +1,169 @@
+import hashlib
+
+from .MosparoException import MosparoException
+
+class _FormSchemaMismatch(Exception):
+    pass
+
+class FormSchema:
+    """
+    A form schema is compiled once from a sample submission of a form. It contains the cleaned names of all fields
+    in the order in which mosparo expects them, so that for every submission of the same form only the values have
+    to be hashed. The values of the sample are not stored.
+
+    :param dict sample_form_data: A sample submission of the form
+    :raises MosparoException: if the sample cannot be compiled to a form schema
+    """
+
+    TOKEN_KEYS: frozenset = frozenset(['_mosparo_submitToken', '_mosparo_validationToken'])
+
+    _LIST = 'list'
+
+    key: frozenset = None
+
+    def __init__(self, sample_form_data: dict) -> None:
+        if type(sample_form_data) != dict:
+            raise MosparoException('The form data cannot be compiled to a form schema.')
+
+        self.key = self.create_key(sample_form_data)
+        self._plan = self._compile(sample_form_data)
+
+    @classmethod
+    def create_key(cls, form_data: dict) -> frozenset:
+        """
+        Returns the key to look up the form schema for the given form data.
+
+        :param dict form_data: The submitted form data
+        :return: The field names of the form data without the mosparo tokens
+        :rtype: frozenset
+        """
+        return frozenset(form_data.keys()) - cls.TOKEN_KEYS
+
+    def has_same_fields(self, form_schema) -> bool:
+        """
+        Returns True, if the given form schema has the same fields, including the nested fields.
+
+        :param FormSchema form_schema: The other form schema
+        :return: True, if both form schemas prepare the same form data
+        :rtype: bool
+        """
+        return self._plan == form_schema._plan
+
+    def prepare_form_data(self, form_data: dict) -> dict:
+        """
+        Prepares the form data to be sent to mosparo. The result is the same as the result of
+        `RequestHelper.prepare_form_data`.
+
+        :param dict form_data: The submitted form data
+        :return: The prepared form data or None, if the form data does not match the form schema
+        :rtype: dict
+        """
+        try:
+            return self._prepare(self._plan, form_data, 1)
+        except _FormSchemaMismatch:
+            return None
+
+    def _compile(self, form_data):
+        """
+        Compiles the given form data to a plan. A dictionary is compiled to a tuple with the field names and the
+        sorted list of the cleaned field names, the field names and the plans of the values. A value is compiled to
+        None and a list of values to the list marker.
+
+        :param form_data: The sample form data
+        :return: The compiled plan
+        :raises MosparoException: if the sample cannot be compiled to a form schema
+        """
+        if type(form_data) == list:
+            for val in form_data:
+                if type(val) not in (str, int, float, bool):
+                    raise MosparoException('The form data cannot be compiled to a form schema.')
+
+            return self._LIST
+
+        entries = {}
+        for key, val in form_data.items():
+            if key in self.TOKEN_KEYS:
+                continue
+
+            cleaned_key = key
+            if type(key) == str and '[]' in key:
+                cleaned_key = key[0:key.find('[]')]
+
+            if cleaned_key in entries or type(cleaned_key) != str:
+                raise MosparoException('The form data cannot be compiled to a form schema.')
+
+            if type(val) == dict or type(val) == list:
+                entries[cleaned_key] = (key, self._compile(val))
+            elif type(val) in (str, int, float, bool):
+                entries[cleaned_key] = (key, None)
+            else:
+                raise MosparoException('The form data cannot be compiled to a form schema.')
+
+        return (
+            frozenset(key for key, plan in entries.values()),
+            tuple((cleaned_key, key, plan) for cleaned_key, (key, plan) in sorted(entries.items()))
+        )
+
+    def _prepare(self, plan, form_data, depth: int):
+        """
+        Prepares the form data with the given plan.
+
+        :param plan: The compiled plan
+        :param form_data: The submitted form data
+        :param int depth: The depth of the form data in the submission
+        :return: The prepared form data
+        :raises _FormSchemaMismatch: if the form data does not match the plan
+        """
+        if plan is self._LIST:
+            if type(form_data) != list:
+                raise _FormSchemaMismatch()
+
+            return [self._hash_value(val, depth) for val in form_data]
+
+        if type(form_data) != dict:
+            raise _FormSchemaMismatch()
+
+        keys, entries = plan
+        number_of_fields = len(form_data)
+        for key in self.TOKEN_KEYS:
+            if key in form_data:
+                number_of_fields -= 1
+
+        if number_of_fields != len(keys):
+            raise _FormSchemaMismatch()
+
+        data = {}
+        for cleaned_key, key, child_plan in entries:
+            if key not in form_data:
+                raise _FormSchemaMismatch()
+
+            if child_plan is None:
+                data[cleaned_key] = self._hash_value(form_data[key], depth)
+            else:
+                data[cleaned_key] = self._prepare(child_plan, form_data[key], depth + 1)
+
+        return data
+
+    def _hash_value(self, val, depth: int) -> str:
+        """
+        Cleans up and hashes the given value.
+
+        `RequestHelper.prepare_form_data` cleans up the nested form data once for every level, so the line breaks are
+        normalized as often as the depth of the value.
+
+        :param val: The submitted value
+        :param int depth: The depth of the value in the submission
+        :return: The hash of the value
+        :rtype: str
+        :raises _FormSchemaMismatch: if the value is not a string, number or boolean
+        """
+        if type(val) == str:
+            if "\r\n" in val:
+                for i in range(depth):
+                    val = val.replace("\r\n", "\n")
+        elif type(val) == int or type(val) == float or type(val) == bool:
+            val = str(val)
+        else:
+            raise _FormSchemaMismatch()
+
+        return hashlib.sha256(val.encode()).hexdigest()
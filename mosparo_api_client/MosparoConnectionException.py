@@ -0,0 +1,7 @@
+from .MosparoException import MosparoException
+
+class MosparoConnectionException(MosparoException):
+    """
+    Will be raised when the request could not be sent to mosparo or the connection to mosparo failed.
+    """
+    pass
@@ -0,0 +1,7 @@
+from .MosparoException import MosparoException
+
+class MosparoResponseTooLargeException(MosparoException):
+    """
+    Will be raised when the response of mosparo is larger than the allowed maximum response size.
+    """
+    pass
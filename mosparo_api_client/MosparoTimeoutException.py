@@ -0,0 +1,7 @@
+from .MosparoConnectionException import MosparoConnectionException
+
+class MosparoTimeoutException(MosparoConnectionException):
+    """
+    Will be raised when the request to mosparo could not be completed within the given time budget.
+    """
+    pass
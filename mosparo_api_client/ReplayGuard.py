@@ -0,0 +1,135 @@
+import threading
+import time
+from collections import OrderedDict
+
+from .VerificationResult import VerificationResult
+
+class ReplayGuard:
+    """
+    The replay guard remembers recently verified pairs of submit and validation tokens and their outcome, so that
+    a repeated submission of the same tokens can be answered without sending a request to mosparo. The form data is
+    not compared, so a repeated submission with the same tokens but different form data gets the remembered result.
+
+    A submit token can only be verified once. If remembered tokens were verified successfully, every repeated
+    submission of these tokens is answered with a not submittable result. Otherwise, the remembered result is
+    returned.
+
+    :param int max_entries: The maximum number of token pairs which are remembered
+    :param float ttl: The number of seconds a token pair is remembered
+    """
+
+    REPLAY_ISSUE_MESSAGE: str = 'Submit token already verified.'
+
+    max_entries: int = 10000
+    ttl: float = 300.0
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 300.0) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def lookup(self, submit_token: str, validation_token: str) -> VerificationResult:
+        """
+        Returns the remembered result for the given submit and validation token.
+
+        :param str submit_token: The submit token which was submitted with the form
+        :param str validation_token: The validation token which was submitted with the form
+        :return: The remembered VerificationResult object or None, if the tokens are not known
+        :rtype: VerificationResult
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+
+            entry = self._entries.get((submit_token, validation_token))
+            if entry is None:
+                self._misses += 1
+                return None
+
+            self._hits += 1
+            return entry[1]
+
+    def remember(self, submit_token: str, validation_token: str, result: VerificationResult) -> None:
+        """
+        Remembers the outcome of the verification of the given submit and validation token.
+
+        :param str submit_token: The submit token which was verified
+        :param str validation_token: The validation token which was verified
+        :param VerificationResult result: The result of the verification
+        """
+        if result.is_submittable():
+            result = VerificationResult(False, False, {}, [{'message': self.REPLAY_ISSUE_MESSAGE}])
+
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+
+            key = (submit_token, validation_token)
+            self._entries.pop(key, None)
+            self._entries[key] = (now + self.ttl, result)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def clear(self) -> None:
+        """
+        Forgets all remembered token pairs. The counters are not reset.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def get_hits(self) -> int:
+        """
+        Returns the number of lookups which found a remembered token pair
+
+        :return: The number of hits
+        :rtype: int
+        """
+        return self._hits
+
+    def get_misses(self) -> int:
+        """
+        Returns the number of lookups which did not find a remembered token pair
+
+        :return: The number of misses
+        :rtype: int
+        """
+        return self._misses
+
+    def get_evictions(self) -> int:
+        """
+        Returns the number of token pairs which were forgotten before their time to live expired
+
+        :return: The number of evictions
+        :rtype: int
+        """
+        return self._evictions
+
+    def get_size(self) -> int:
+        """
+        Returns the number of currently remembered token pairs
+
+        :return: The number of remembered token pairs
+        :rtype: int
+        """
+        return len(self._entries)
+
+    def _expire(self, now: float) -> None:
+        """
+        Removes all expired entries. Since all entries have the same time to live, the entries are ordered by their
+        expiry time and only the oldest entries have to be checked.
+
+        :param float now: The current monotonic time
+        """
+        while self._entries:
+            expires_at, result = next(iter(self._entries.values()))
+            if expires_at > now:
+                break
+
+            self._entries.popitem(last=False)
@@ -1,21 +1,47 @@
 import hmac
 import hashlib
 import json
+import time
+
+from .FormSchema import FormSchema
+from .RequestProfiler import RequestProfiler
 
 class RequestHelper:
     """
     The request helper supports the client with the creation of the hashes and cleaning up the form data.
 
+    The configuration of the request helper cannot be changed after the initialization. The request helper does not
+    modify the given form data, so one request helper can be shared between threads.
+
     :param str public_key: The public key of the mosparo project
     :param str private_key: The private key of the mosparo project
+    :param RequestProfiler profiler: Optional profiler which collects metrics about the preparation of the form data
+    :param dict form_schemas: Optional dictionary with the compiled form schemas, indexed by their key
     """
 
     public_key: str = ''
     private_key: str = ''
+    profiler: RequestProfiler = None
+    form_schemas: dict = None
 
-    def __init__(self, public_key: str, private_key: str) -> None:
+    def __init__(self, public_key: str, private_key: str, profiler: RequestProfiler = None,
+                 form_schemas: dict = None) -> None:
         self.public_key = public_key
         self.private_key = private_key
+        self.profiler = profiler
+        self.form_schemas = form_schemas
+        self._configured = True
+
+    def __setattr__(self, name: str, value) -> None:
+        """
+        Prevents changes of the configuration after the initialization.
+
+        :raises AttributeError: if a configuration attribute is changed after the initialization
+        """
+        if not name.startswith('_') and getattr(self, '_configured', False):
+            raise AttributeError('The configuration of the request helper cannot be changed after the initialization.')
+
+        super().__setattr__(name, value)
 
     def create_hmac_hash(self, data: str) -> str:
         """
@@ -28,16 +54,61 @@ class RequestHelper:
         hmac_obj = hmac.new(key=self.private_key.encode(), msg=data.encode(), digestmod=hashlib.sha256)
         return hmac_obj.hexdigest()
 
-    def prepare_form_data(self, form_data: dict) -> dict:
+    def prepare_form_data(self, form_data: dict, record: dict = None) -> dict:
+        """
+        Prepares the form data to be sent to mosparo. If a form schema matches the form data, the form schema
+        prepares the form data.
+
+        :param dict form_data: The submitted form data
+        :param dict record: Optional profiling record which collects the metrics of this call
+        :return: The prepared form data
+        :rtype: dict
+        """
+        own_record = False
+        if record is None and self.profiler is not None and self.profiler.should_sample('prepare_form_data'):
+            record = self.profiler.create_record('prepare_form_data')
+            own_record = True
+
+        if record is not None:
+            start = time.perf_counter()
+
+        data = None
+        if self.form_schemas and type(form_data) == dict:
+            form_schema = self.form_schemas.get(FormSchema.create_key(form_data))
+            if form_schema is not None:
+                data = form_schema.prepare_form_data(form_data)
+
+        if data is None:
+            data = self._prepare_form_data(form_data, record)
+        elif record is not None:
+            record['form_schema'] = True
+
+        if own_record:
+            record['total_time'] = time.perf_counter() - start
+            self.profiler.add_record(record)
+
+        return data
+
+    def _prepare_form_data(self, form_data: dict, record: dict = None, depth: int = 1) -> dict:
         """
-        Prepares the form data to be sent to mosparo
+        Prepares the form data and collects the metrics in the given profiling record
 
         :param dict form_data: The submitted form data
+        :param dict record: The profiling record or None, if the call is not profiled
+        :param int depth: The depth of the form data in the submitted form data
         :return: The prepared form data
         :rtype: dict
         """
+        if record is not None:
+            start = time.perf_counter()
+
         form_data = self.cleanup_form_data(form_data)
 
+        if record is not None:
+            record['normalization_time'] += time.perf_counter() - start
+            record['nodes'] += 1
+            record['depth'] = max(record['depth'], depth)
+
         is_list = False
         data = {}
         if type(form_data) == list:
@@ -49,15 +120,25 @@ class RequestHelper:
 
         for key, val in form_data:
             if type(val) == dict or type(val) == list:
-                data[key] = self.prepare_form_data(val)
+                data[key] = self._prepare_form_data(val, record, depth + 1)
             else:
                 if type(val) == int or type(val) == float or type(val) == bool:
                     val = str(val)
 
+                if record is not None:
+                    start = time.perf_counter()
+
+                encoded_val = val.encode()
                 hash_obj = hashlib.sha256()
-                hash_obj.update(val.encode())
+                hash_obj.update(encoded_val)
                 valHash = hash_obj.hexdigest()
 
+                if record is not None:
+                    record['hashing_time'] += time.perf_counter() - start
+                    record['nodes'] += 1
+                    record['leaves'] += 1
+                    record['leaf_bytes'] += len(encoded_val)
+
                 if is_list:
                     data.append(valHash)
                 else:
@@ -76,12 +157,6 @@ class RequestHelper:
         :return: The cleaned form data
         :rtype: dict
         """
-        if '_mosparo_submitToken' in form_data:
-            form_data.pop('_mosparo_submitToken')
-
-        if '_mosparo_validationToken' in form_data:
-            form_data.pop('_mosparo_validationToken')
-
         is_list = False
         cleaned_data = {}
         if type(form_data) == list:
@@ -92,6 +167,9 @@ class RequestHelper:
             form_data = form_data.items()
 
         for key, val in form_data:
+            if not is_list and (key == '_mosparo_submitToken' or key == '_mosparo_validationToken'):
+                continue
+
             if type(key) == str and '[]' in key:
                 pos = key.find('[]')
                 key = key[0:pos]
@@ -111,15 +189,40 @@ class RequestHelper:
 
         return cleaned_data
 
-    def create_form_data_hmac_hash(self, form_data: dict) -> str:
+    def create_form_data_hmac_hash(self, form_data: dict, record: dict = None) -> str:
         """
         Dumps the form data to a JSON string and creates the HMAC hash for the JSON string
 
         :param dict form_data: The form data
+        :param dict record: Optional profiling record which collects the metrics of this call
         :return: The HMAC hash for the given form data
         :rtype: str
         """
-        return self.create_hmac_hash(self.to_json(form_data))
+        own_record = False
+        if record is None and self.profiler is not None and self.profiler.should_sample('create_form_data_hmac_hash'):
+            record = self.profiler.create_record('create_form_data_hmac_hash')
+            own_record = True
+
+        if record is None:
+            return self.create_hmac_hash(self.to_json(form_data))
+
+        start = time.perf_counter()
+
+        json_string = self.to_json(form_data)
+        serialized = time.perf_counter()
+
+        hmac_hash = self.create_hmac_hash(json_string)
+        end = time.perf_counter()
+
+        record['serialization_time'] += serialized - start
+        record['hashing_time'] += end - serialized
+        record['serialized_bytes'] += len(json_string)
+
+        if own_record:
+            record['total_time'] = end - start
+            self.profiler.add_record(record)
+
+        return hmac_hash
 
     def to_json(self, form_data: dict) -> str:
         """
@@ -0,0 +1,110 @@
+import threading
+import time
+from collections import deque
+
+class RequestProfiler:
+    """
+    The request profiler collects metrics about the preparation of the form data in the request helper. To keep the
+    overhead low, only every n-th call is profiled. The calls are counted separately for every profiled method, so
+    that methods which are always called together are sampled independently of each other. The client profiles a
+    verification as a whole and creates one record for the preparation and the signing of the form data.
+
+    Every record contains the name of the profiled method, the number of nodes and leaves, the number of hashed
+    leaf bytes, the maximum depth of the form data, the length of the serialized form data, whether a form schema
+    prepared the form data and the time in seconds spent in the normalization, hashing and serialization of the form
+    data. The form schema does not collect the node metrics and its time is only part of the total time.
+
+    :param int sample_rate: Every n-th call is profiled (1 profiles every call)
+    :param int max_records: The maximum number of records which are kept; older records are discarded
+    :raises ValueError: if the sample rate is lower than 1
+    """
+
+    sample_rate: int = 1
+    max_records: int = 1000
+
+    def __init__(self, sample_rate: int = 1, max_records: int = 1000) -> None:
+        if sample_rate < 1:
+            raise ValueError('The sample rate has to be 1 or higher.')
+
+        self.sample_rate = sample_rate
+        self.max_records = max_records
+
+        self._records = deque(maxlen=max_records)
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def should_sample(self, method: str) -> bool:
+        """
+        Counts the call of the given method and returns True, if the call should be profiled.
+
+        :param str method: The name of the called method
+        :return: True, if the call should be profiled
+        :rtype: bool
+        """
+        with self._lock:
+            calls = self._calls.get(method, 0) + 1
+            self._calls[method] = calls
+
+            return calls % self.sample_rate == 0
+
+    def create_record(self, method: str) -> dict:
+        """
+        Creates an empty record for the given method.
+
+        :param str method: The name of the profiled method
+        :return: The empty record
+        :rtype: dict
+        """
+        return {
+            'method': method,
+            'timestamp': time.time(),
+            'nodes': 0,
+            'leaves': 0,
+            'leaf_bytes': 0,
+            'depth': 0,
+            'serialized_bytes': 0,
+            'form_schema': False,
+            'normalization_time': 0.0,
+            'hashing_time': 0.0,
+            'serialization_time': 0.0,
+            'total_time': 0.0,
+        }
+
+    def add_record(self, record: dict) -> None:
+        """
+        Stores the given record.
+
+        :param dict record: The completed record
+        """
+        with self._lock:
+            self._records.append(record)
+
+    def export(self, clear: bool = False) -> list:
+        """
+        Returns a copy of all stored records, the oldest record first.
+
+        :param bool clear: Set to True, if the stored records should be removed
+        :return: List with all stored records
+        :rtype: list
+        """
+        with self._lock:
+            records = [dict(record) for record in self._records]
+
+            if clear:
+                self._records.clear()
+
+        return records
+
+    def get_number_of_calls(self, method: str = None) -> int:
+        """
+        Returns the number of calls, including the calls which were not profiled
+
+        :param str method: The name of the method or None for the calls of all methods
+        :return: The number of calls
+        :rtype: int
+        """
+        with self._lock:
+            if method is None:
+                return sum(self._calls.values())
+
+            return self._calls.get(method, 0)
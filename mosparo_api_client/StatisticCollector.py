@@ -0,0 +1,109 @@
+import math
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from .StatisticResult import StatisticResult
+
+class StatisticCollector:
+    """
+    The statistic collector fetches the statistic data for many projects and time ranges at once. The requests are
+    sent in parallel over the pooled connections of the clients.
+
+    Every query is a tuple with the client of the project, the time range in seconds and the start date, like the
+    arguments of `Client.get_statistic_by_date`. If there are multiple queries with either a time range or a start
+    date for the same client, the queries are combined: the widest time range is fetched once and the other time
+    ranges are sliced from it. For this, time ranges are rounded up to full days and converted to a start date based
+    on the local date, which requires mosparo v1.1. All other queries, including queries with a time range and a
+    start date, are sent to mosparo unchanged.
+
+    :param int max_workers: The maximum number of requests which are sent at the same time
+    """
+
+    max_workers: int = 4
+
+    def __init__(self, max_workers: int = 4) -> None:
+        self.max_workers = max_workers
+
+    def collect(self, queries: list) -> dict:
+        """
+        Returns the statistic data for all the given queries.
+
+        :param list queries: A list of tuples with the client, the time range in seconds and the start date
+        :return: A dictionary with the queries as keys and the StatisticResult objects as values
+        :rtype: dict
+        :raises MosparoException: if an error occurred or was returned from mosparo
+        """
+        today = date.today()
+        fetches = {}
+        slices = {}
+        combinable_queries = {}
+
+        for query in queries:
+            client, range, start_date = query
+
+            if (range > 0) != (start_date is not None):
+                combinable_queries.setdefault(client, {})[query] = None
+            else:
+                fetches[query] = None
+                slices[query] = (query, None)
+
+        for client, client_queries in combinable_queries.items():
+            if len(client_queries) == 1:
+                query = next(iter(client_queries))
+                fetches[query] = None
+                slices[query] = (query, None)
+                continue
+
+            start_dates = {}
+            for query in client_queries:
+                client, range, start_date = query
+                if start_date is None:
+                    start_date = today - timedelta(days=math.ceil(range / 86400))
+
+                start_dates[query] = start_date
+
+            widest_query = (client, 0, min(start_dates.values()))
+            fetches[widest_query] = None
+            for query, start_date in start_dates.items():
+                slices[query] = (widest_query, start_date)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {}
+            for fetch_query in fetches:
+                client, range, start_date = fetch_query
+                futures[fetch_query] = executor.submit(client.get_statistic_by_date, range, start_date)
+
+            results = {key: future.result() for key, future in futures.items()}
+
+        collected = {}
+        for query, (key, start_date) in slices.items():
+            if start_date is None or start_date == key[2]:
+                collected[query] = results[key]
+            else:
+                collected[query] = self._slice_result(results[key], start_date)
+
+        return collected
+
+    def _slice_result(self, result: StatisticResult, start_date: date) -> StatisticResult:
+        """
+        Returns a new result which contains only the numbers from the given start date.
+
+        :param StatisticResult result: The result of the widest time range
+        :param datetime.date start_date: The start date of the sliced time range
+        :return: The sliced StatisticResult object
+        :rtype: StatisticResult
+        """
+        first_day = start_date.strftime('%Y-%m-%d')
+        numbers_by_date = {}
+        number_of_valid_submissions = 0
+        number_of_spam_submissions = 0
+
+        for day, numbers in (result.get_numbers_by_date() or {}).items():
+            if day < first_day:
+                continue
+
+            numbers_by_date[day] = numbers
+            number_of_valid_submissions += numbers['numberOfValidSubmissions']
+            number_of_spam_submissions += numbers['numberOfSpamSubmissions']
+
+        return StatisticResult(number_of_valid_submissions, number_of_spam_submissions, numbers_by_date)
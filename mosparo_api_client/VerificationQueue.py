@@ -0,0 +1,247 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .Client import Client
+from .MosparoConnectionException import MosparoConnectionException
+from .MosparoException import MosparoException
+from .VerificationResult import VerificationResult
+
+logger = logging.getLogger(__name__)
+
+class VerificationQueue:
+    """
+    The verification queue stores prepared and signed verification requests in a local SQLite database, for example,
+    while mosparo is not reachable. A background worker sends the stored requests to mosparo as soon as mosparo is
+    reachable again and reports the result of every request to the callback.
+
+    A request is removed from the queue only after the callback returned. If the callback raises an exception,
+    the result is stored in the queue and reported again later, without sending the request to mosparo again.
+
+    A verification which raised a MosparoTimeoutException must not be enqueued, since mosparo may already have
+    received the request and a second request with the same submit token is not submittable. The queue sends the
+    stored requests without a time budget.
+
+    :param Client client: The client which prepares and sends the verification requests
+    :param str path: The path to the SQLite database file
+    :param callable callback: Called with the queue ID and the VerificationResult object of every processed request
+    :param int concurrency: The maximum number of requests which are sent to mosparo at the same time
+    :param float retry_interval: The number of seconds to wait before retrying, if mosparo is not reachable
+    """
+
+    _PROCESSED = 'processed'
+    _UNREACHABLE = 'unreachable'
+    _CALLBACK_FAILED = 'callback-failed'
+
+    client: Client = None
+    path: str = ''
+    callback = None
+    concurrency: int = 2
+    retry_interval: float = 5.0
+
+    def __init__(self, client: Client, path: str, callback, concurrency: int = 2, retry_interval: float = 5.0) -> None:
+        self.client = client
+        self.path = path
+        self.callback = callback
+        self.concurrency = concurrency
+        self.retry_interval = retry_interval
+
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection_lock = threading.Lock()
+        self._process_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._worker = None
+
+        with self._connection_lock, self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS verification_queue ('
+                'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                'request_data TEXT NOT NULL, '
+                'request_signature TEXT NOT NULL, '
+                'verification_signature TEXT NOT NULL, '
+                'created_at REAL NOT NULL, '
+                'result TEXT)'
+            )
+
+    def enqueue(self, form_data: dict, submit_token: str = None, validation_token: str = None) -> int:
+        """
+        Prepares and signs the verification request for the given form data and stores it in the queue.
+
+        :param dict form_data: The dictionary with all the form data.
+        :param str submit_token: The submit token which was submitted with the form
+        :param str validation_token: The validation token which was submitted with the form
+        :return: The queue ID of the stored request
+        :rtype: int
+        :raises MosparoException: if the submit or validation token is not available
+        """
+        submit_token, validation_token = self.client.get_tokens(form_data, submit_token, validation_token)
+        request_data, request_signature, verification_signature = self.client.prepare_verification(
+            form_data,
+            submit_token,
+            validation_token
+        )
+
+        with self._connection_lock, self._connection:
+            cursor = self._connection.execute(
+                'INSERT INTO verification_queue '
+                '(request_data, request_signature, verification_signature, created_at) VALUES (?, ?, ?, ?)',
+                (json.dumps(request_data), request_signature, verification_signature, time.time())
+            )
+            queue_id = cursor.lastrowid
+
+        self._wakeup.set()
+
+        return queue_id
+
+    def process(self) -> int:
+        """
+        Sends the stored requests to mosparo and stops as soon as mosparo is not reachable.
+
+        :return: The number of processed requests
+        :rtype: int
+        """
+        processed, reachable = self._drain()
+
+        return processed
+
+    def start(self) -> None:
+        """
+        Starts the background worker which processes the queue. If the worker is still running after a stop,
+        it keeps running.
+        """
+        self._stopped.clear()
+
+        if self._worker is not None and self._worker.is_alive():
+            return
+
+        self._worker = threading.Thread(target=self._run, name='mosparo-verification-queue', daemon=True)
+        self._worker.start()
+
+    def stop(self, timeout: float = None) -> None:
+        """
+        Stops the background worker. Requests which were not processed stay in the queue.
+
+        :param float timeout: The number of seconds to wait for the worker to finish
+        """
+        self._stopped.set()
+        self._wakeup.set()
+
+        if self._worker is not None:
+            self._worker.join(timeout)
+
+            if not self._worker.is_alive():
+                self._worker = None
+
+    def close(self) -> None:
+        """
+        Stops the background worker and closes the database connection.
+        """
+        self.stop()
+
+        with self._connection_lock:
+            self._connection.close()
+
+    def get_size(self) -> int:
+        """
+        Returns the number of requests in the queue
+
+        :return: The number of requests in the queue
+        :rtype: int
+        """
+        with self._connection_lock:
+            return self._connection.execute('SELECT COUNT(*) FROM verification_queue').fetchone()[0]
+
+    def _run(self) -> None:
+        """
+        Processes the queue until the worker is stopped. If mosparo is not reachable, the worker waits for the
+        retry interval before it tries again, otherwise it waits for new requests.
+        """
+        while not self._stopped.is_set():
+            self._wakeup.clear()
+
+            reachable = True
+            try:
+                processed, reachable = self._drain(True)
+            except Exception:
+                logger.exception('An error occurred while processing the verification queue.')
+
+            if reachable:
+                self._wakeup.wait(self.retry_interval)
+            else:
+                self._stopped.wait(self.retry_interval)
+
+    def _drain(self, stoppable: bool = False) -> tuple:
+        """
+        Sends the stored requests in batches of the configured concurrency to mosparo.
+
+        :param bool stoppable: Set to True, if the draining should end when the worker is stopped
+        :return: A tuple with the number of processed requests and whether mosparo was reachable
+        :rtype: tuple
+        """
+        processed = 0
+        with self._process_lock, ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            last_id = 0
+            while not (stoppable and self._stopped.is_set()):
+                with self._connection_lock:
+                    entries = self._connection.execute(
+                        'SELECT id, request_data, request_signature, verification_signature, result '
+                        'FROM verification_queue '
+                        'WHERE id > ? ORDER BY id LIMIT ?',
+                        (last_id, self.concurrency)
+                    ).fetchall()
+
+                if not entries:
+                    break
+
+                last_id = entries[-1][0]
+                outcomes = list(executor.map(self._process_entry, entries))
+                processed += outcomes.count(self._PROCESSED)
+
+                if self._UNREACHABLE in outcomes:
+                    return processed, False
+
+        return processed, True
+
+    def _process_entry(self, entry: tuple) -> str:
+        """
+        Sends one stored request to mosparo, reports the result to the callback and removes the request from the
+        queue. Errors returned by mosparo are reported as issues of a not submittable result. If the request was
+        already sent, the stored result is reported again.
+
+        :param tuple entry: The stored request
+        :return: The outcome of the processing
+        :rtype: str
+        """
+        queue_id, request_data, request_signature, verification_signature, stored_result = entry
+
+        if stored_result is None:
+            try:
+                res = self.client.send_verification(json.loads(request_data), request_signature)
+                result = self.client.create_verification_result(res, verification_signature)
+            except MosparoConnectionException:
+                return self._UNREACHABLE
+            except MosparoException as exc:
+                result = VerificationResult(False, False, {}, [{'message': str(exc)}])
+
+            with self._connection_lock, self._connection:
+                self._connection.execute(
+                    'UPDATE verification_queue SET result = ? WHERE id = ?',
+                    (json.dumps([result.submittable, result.valid, result.verified_fields, result.issues]), queue_id)
+                )
+        else:
+            result = VerificationResult(*json.loads(stored_result))
+
+        try:
+            self.callback(queue_id, result)
+        except Exception:
+            logger.exception('The callback for the queued verification %d failed.', queue_id)
+            return self._CALLBACK_FAILED
+
+        with self._connection_lock, self._connection:
+            self._connection.execute('DELETE FROM verification_queue WHERE id = ?', (queue_id,))
+
+        return self._PROCESSED
@@ -2,7 +2,15 @@ __project__ = 'mosparo_api_client'
 __version__ = "1.1.2"
 
 from .Client import *
+from .FormSchema import *
+from .MosparoConnectionException import *
 from .MosparoException import *
+from .MosparoResponseTooLargeException import *
+from .MosparoTimeoutException import *
+from .ReplayGuard import *
 from .RequestHelper import *
+from .RequestProfiler import *
+from .StatisticCollector import *
 from .StatisticResult import *
+from .VerificationQueue import *
 from .VerificationResult import *
\ No newline at end of file
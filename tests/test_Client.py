@@ -1,8 +1,16 @@
+import hashlib
+import hmac
 import json
+import threading
+import time
 from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 import pytest
-from mosparo_api_client import Client, RequestHelper, VerificationResult, StatisticResult, MosparoException
+import requests
+from mosparo_api_client import Client, RequestHelper, VerificationResult, StatisticResult, MosparoException, \
+    MosparoResponseTooLargeException, MosparoTimeoutException, ReplayGuard, FormSchema, RequestProfiler, \
+    MosparoConnectionException
 
 def test_verify_submission_without_tokens():
     api_client = Client('http://test.local', 'testPublicKey', 'testPrivateKey')
@@ -58,6 +66,19 @@ def test_verify_submission_connection_error(requests_mock):
 
     assert 'An error occurred while sending the request to mosparo.' in str(exc.value)
 
+@pytest.mark.parametrize('status_code, text', [(502, '<html><body>Bad Gateway</body></html>'), (503, '')])
+def test_verify_submission_server_error(requests_mock, status_code, text):
+    requests_mock.post('http://test.local/api/v1/verification/verify', text=text, status_code=status_code)
+
+    api_client = Client('http://test.local', 'testPublicKey', 'testPrivateKey')
+
+    with pytest.raises(MosparoConnectionException) as exc:
+        result = api_client.verify_submission({
+            'name': 'John Example'
+        }, 'submitToken', 'validationToken')
+
+    assert 'mosparo is not available (HTTP status %d).' % status_code in str(exc.value)
+
 def test_verify_submission_is_valid(requests_mock):
     public_key = 'testPublicKey'
     private_key = 'testPrivateKey'
@@ -98,6 +119,43 @@ def test_verify_submission_is_valid(requests_mock):
     assert request_data['validationSignature'] == validation_signature
     assert request_data['formSignature'] == form_signature
 
+def test_prepare_and_send_verification_separately(requests_mock):
+    public_key = 'testPublicKey'
+    private_key = 'testPrivateKey'
+    form_data = {
+        'name': 'John Example',
+        '_mosparo_submitToken': 'submitToken',
+        '_mosparo_validationToken': 'validationToken'
+    }
+
+    api_client = Client('http://test.local', public_key, private_key)
+
+    submit_token, validation_token = api_client.get_tokens(form_data)
+    request_data, request_signature, verification_signature = api_client.prepare_verification(
+        form_data,
+        submit_token,
+        validation_token
+    )
+
+    assert submit_token == 'submitToken'
+    assert validation_token == 'validationToken'
+    assert requests_mock.call_count == 0
+
+    requests_mock.post('http://test.local/api/v1/verification/verify', json={
+        'valid': True,
+        'verificationSignature': verification_signature,
+        'verifiedFields': { 'name': VerificationResult.FIELD_VALID },
+        'issues': []
+    }, status_code=200)
+
+    res = api_client.send_verification(request_data, request_signature)
+    result = api_client.create_verification_result(res, verification_signature)
+
+    assert requests_mock.call_count == 1
+    assert json.loads(requests_mock.last_request.text) == request_data
+    assert result.is_submittable() is True
+    assert result.get_verified_field('name') == VerificationResult.FIELD_VALID
+
 def test_verify_submission_is_not_valid(requests_mock):
     public_key = 'testPublicKey'
     private_key = 'testPrivateKey'
@@ -245,4 +303,391 @@ def test_get_statistic_by_date_returns_error(requests_mock):
 
     assert 'Request not valid' in str(exc.value)
 
+def test_verify_submission_invalid_json_response(requests_mock):
+    requests_mock.post('http://test.local/api/v1/verification/verify', text='<html></html>')
+
+    api_client = Client('http://test.local', 'testPublicKey', 'testPrivateKey')
+
+    with pytest.raises(MosparoException) as exc:
+        result = api_client.verify_submission({
+            'name': 'John Example'
+        }, 'submitToken', 'validationToken')
+
+    assert 'Response from API invalid.' in str(exc.value)
+
+def test_verify_submission_response_too_large(requests_mock):
+    requests_mock.post('http://test.local/api/v1/verification/verify', json={
+        'valid': False,
+        'issues': [{'message': 'x' * 2048}]
+    }, status_code=200)
+
+    api_client = Client('http://test.local', 'testPublicKey', 'testPrivateKey', max_response_size=1024)
+
+    with pytest.raises(MosparoResponseTooLargeException) as exc:
+        result = api_client.verify_submission({
+            'name': 'John Example'
+        }, 'submitToken', 'validationToken')
+
+    assert 'Response from API exceeds the maximum response size.' in str(exc.value)
+
+def test_verify_submission_response_too_large_by_content_length(requests_mock):
+    requests_mock.post('http://test.local/api/v1/verification/verify', text='{}', headers={
+        'Content-Length': '5000000'
+    }, status_code=200)
+
+    api_client = Client('http://test.local', 'testPublicKey', 'testPrivateKey')
+
+    with pytest.raises(MosparoResponseTooLargeException):
+        result = api_client.verify_submission({
+            'name': 'John Example'
+        }, 'submitToken', 'validationToken')
+
+def test_get_statistic_by_date_response_too_large(requests_mock):
+    requests_mock.get('http://test.local/api/v1/statistic/by-date', json={
+        'result': True,
+        'data': {
+            'numberOfValidSubmissions': 0,
+            'numberOfSpamSubmissions': 0,
+            'numbersByDate': {'2021-04-29': {'numberOfValidSubmissions': 0, 'numberOfSpamSubmissions': 0}}
+        }
+    }, status_code=200)
+
+    api_client = Client('http://test.local', 'testPublicKey', 'testPrivateKey', max_response_size=64)
+
+    with pytest.raises(MosparoException):
+        result = api_client.get_statistic_by_date()
+
+def test_verify_submission_with_replay_guard(requests_mock):
+    public_key = 'testPublicKey'
+    private_key = 'testPrivateKey'
+    submit_token = 'submitToken'
+    validation_token = 'validationToken'
+    form_data = {'name': 'John Example'}
+
+    request_helper = RequestHelper(public_key, private_key)
+
+    prepared_form_data = request_helper.prepare_form_data(dict(form_data))
+    form_signature = request_helper.create_form_data_hmac_hash(prepared_form_data)
+
+    validation_signature = request_helper.create_hmac_hash(validation_token)
+    verification_signature = request_helper.create_hmac_hash(validation_signature + form_signature)
+
+    requests_mock.post('http://test.local/api/v1/verification/verify', json={
+        'valid': True,
+        'verificationSignature': verification_signature,
+        'verifiedFields': { 'name': VerificationResult.FIELD_VALID },
+        'issues': []
+    }, status_code=200)
+
+    replay_guard = ReplayGuard()
+    api_client = Client('http://test.local', public_key, private_key, replay_guard=replay_guard)
+
+    result = api_client.verify_submission(dict(form_data), submit_token, validation_token)
+    replayed_result = api_client.verify_submission(dict(form_data), submit_token, validation_token)
+
+    assert result.is_submittable() is True
+    assert replayed_result.is_submittable() is False
+    assert replayed_result.get_issues()[0]['message'] == ReplayGuard.REPLAY_ISSUE_MESSAGE
+    assert requests_mock.call_count == 1
+    assert replay_guard.get_hits() == 1
+    assert replay_guard.get_misses() == 1
+
+def test_verify_submission_with_replay_guard_connection_error(requests_mock):
+    requests_mock.post('http://test.local/api/v1/verification/verify', exc='Connection failed')
+
+    replay_guard = ReplayGuard()
+    api_client = Client('http://test.local', 'testPublicKey', 'testPrivateKey', replay_guard=replay_guard)
+
+    for i in range(2):
+        with pytest.raises(MosparoException):
+            api_client.verify_submission({'name': 'John Example'}, 'submitToken', 'validationToken')
+
+    assert requests_mock.call_count == 2
+    assert replay_guard.get_size() == 0
+
+def test_verify_submission_with_replay_guard_error_response(requests_mock):
+    requests_mock.post('http://test.local/api/v1/verification/verify', json={
+        'error': True,
+        'errorMessage': 'Temporary error.'
+    }, status_code=200)
+
+    replay_guard = ReplayGuard()
+    api_client = Client('http://test.local', 'testPublicKey', 'testPrivateKey', replay_guard=replay_guard)
+
+    for i in range(2):
+        result = api_client.verify_submission({'name': 'John Example'}, 'submitToken', 'validationToken')
+        assert result.get_issues()[0]['message'] == 'Temporary error.'
+
+    assert requests_mock.call_count == 2
+    assert replay_guard.get_size() == 0
+
+def test_verify_submission_with_replay_guard_not_valid_response(requests_mock):
+    requests_mock.post('http://test.local/api/v1/verification/verify', json={
+        'valid': False,
+        'issues': [{'message': 'Invalid.'}]
+    }, status_code=200)
+
+    replay_guard = ReplayGuard()
+    api_client = Client('http://test.local', 'testPublicKey', 'testPrivateKey', replay_guard=replay_guard)
+
+    api_client.verify_submission({'name': 'John Example'}, 'submitToken', 'validationToken')
+    api_client.verify_submission({'name': 'John Example'}, 'submitToken', 'validationToken')
+    api_client.verify_submission({'name': 'John Example'}, 'submitToken', 'otherValidationToken')
+
+    assert requests_mock.call_count == 2
+    assert replay_guard.get_hits() == 1
+
+def test_verify_submission_with_profiler(requests_mock):
+    requests_mock.post('http://test.local/api/v1/verification/verify', json={
+        'valid': False,
+        'issues': []
+    }, status_code=200)
+
+    profiler = RequestProfiler(sample_rate=2)
+    api_client = Client('http://test.local', 'testPublicKey', 'testPrivateKey', profiler=profiler)
+
+    for i in range(10):
+        api_client.verify_submission({
+            'name': 'John Example',
+            'address': {'street': 'Examplestreet'}
+        }, 'submitToken%d' % i, 'validationToken')
+
+    records = profiler.export()
+
+    assert len(records) == 5
+    for record in records:
+        assert record['method'] == 'verify_submission'
+        assert record['nodes'] == 4
+        assert record['leaves'] == 2
+        assert record['leaf_bytes'] == len('John Example') + len('Examplestreet')
+        assert record['depth'] == 2
+        assert record['serialized_bytes'] > 0
+        assert record['normalization_time'] > 0
+        assert record['serialization_time'] > 0
+        assert record['total_time'] >= record['normalization_time'] + record['serialization_time']
+
+def test_verify_submission_with_timeout_budget(requests_mock):
+    requests_mock.post('http://test.local/api/v1/verification/verify', json={
+        'valid': False,
+        'issues': []
+    }, status_code=200)
+
+    api_client = Client('http://test.local', 'testPublicKey', 'testPrivateKey')
+
+    result = api_client.verify_submission({'name': 'John Example'}, 'submitToken', 'validationToken', timeout_budget=5)
+
+    assert result.is_submittable() is False
+    assert requests_mock.call_count == 1
+
+    assert 0 < requests_mock.last_request.timeout.total <= 5
+
+def test_verify_submission_timeout_budget_exhausted(requests_mock):
+    requests_mock.post('http://test.local/api/v1/verification/verify', json={}, status_code=200)
+
+    api_client = Client('http://test.local', 'testPublicKey', 'testPrivateKey')
+
+    with pytest.raises(MosparoTimeoutException):
+        api_client.verify_submission({'name': 'John Example'}, 'submitToken', 'validationToken', timeout_budget=0)
+
+    assert requests_mock.call_count == 0
+
+def test_verify_submission_timeout(requests_mock):
+    requests_mock.post('http://test.local/api/v1/verification/verify', exc=requests.exceptions.ReadTimeout)
+
+    api_client = Client('http://test.local', 'testPublicKey', 'testPrivateKey')
+
+    with pytest.raises(MosparoTimeoutException) as exc:
+        api_client.verify_submission({'name': 'John Example'}, 'submitToken', 'validationToken', timeout_budget=0.3)
+
+    assert 'The request to mosparo timed out.' in str(exc.value)
+
+def test_verify_submission_with_timeout_budget_shares_watchdog_thread(requests_mock):
+    requests_mock.post('http://test.local/api/v1/verification/verify', json={
+        'valid': False,
+        'issues': []
+    }, status_code=200)
+
+    api_client = Client('http://test.local', 'testPublicKey', 'testPrivateKey')
+
+    for i in range(20):
+        api_client.verify_submission({'name': 'John Example'}, 'submitToken-%d' % i, 'validationToken', timeout_budget=5)
+
+    watchdog_threads = [thread for thread in threading.enumerate() if thread.name == 'mosparo-deadline-watchdog']
+
+    assert len(watchdog_threads) == 1
+    assert not any(type(thread) == threading.Timer for thread in threading.enumerate())
+
+class SlowMosparoHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    header_delay = 0
+    byte_delay = 0
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        time.sleep(self.header_delay)
+
+        body = json.dumps({'valid': False, 'issues': []}).encode()
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+
+        try:
+            for i in range(len(body)):
+                self.wfile.write(body[i:i + 1])
+                time.sleep(self.byte_delay)
+        except OSError:
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+def run_slow_server(header_delay, byte_delay):
+    handler = type('Handler', (SlowMosparoHandler,), {'header_delay': header_delay, 'byte_delay': byte_delay})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return server
+
+@pytest.mark.parametrize('header_delay, byte_delay', [(0, 0.3), (2, 0)])
+def test_verify_submission_timeout_budget_with_slow_server(header_delay, byte_delay):
+    server = run_slow_server(header_delay, byte_delay)
+    api_client = Client('http://127.0.0.1:%d' % server.server_port, 'testPublicKey', 'testPrivateKey')
+
+    try:
+        start = time.monotonic()
+        with pytest.raises(MosparoTimeoutException):
+            api_client.verify_submission({'name': 'John Example'}, 'submitToken', 'validationToken', timeout_budget=0.5)
+
+        assert time.monotonic() - start < 0.8
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def test_client_configuration_is_read_only():
+    api_client = Client('http://test.local', 'testPublicKey', 'testPrivateKey')
+
+    with pytest.raises(AttributeError):
+        api_client.host = 'http://other.local'
+
+    assert api_client.host == 'http://test.local'
+
+class FakeMosparoHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    private_key = 'testPrivateKey'
+
+    def do_POST(self):
+        request_data = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        verification_signature = hmac.new(
+            key=self.private_key.encode(),
+            msg=(request_data['validationSignature'] + request_data['formSignature']).encode(),
+            digestmod=hashlib.sha256
+        ).hexdigest()
+
+        body = json.dumps({
+            'valid': True,
+            'verificationSignature': verification_signature,
+            'verifiedFields': {key: VerificationResult.FIELD_VALID for key in request_data['formData']},
+            'issues': []
+        }).encode()
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.mark.slow
+def test_verify_submission_concurrently(record_property):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeMosparoHandler)
+    server.daemon_threads = True
+    server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+    server_thread.start()
+
+    api_client = Client('http://127.0.0.1:%d' % server.server_port, 'testPublicKey', 'testPrivateKey',
+                        replay_guard=ReplayGuard(), pool_size=16)
+    requests_per_thread = 25
+    throughput = {}
+
+    try:
+        for number_of_threads in (1, 4, 16):
+            results = []
+            errors = []
+
+            def worker(thread_number):
+                try:
+                    for i in range(requests_per_thread):
+                        result = api_client.verify_submission({
+                            'name': 'John Example %d' % i,
+                            'email[]': ['john@example.com', 'john.example@example.com'],
+                            'message': "Line 1\r\nLine 2"
+                        }, 'submitToken-%d-%d-%d' % (number_of_threads, thread_number, i), 'validationToken')
+                        results.append(result)
+                except Exception as exc:
+                    errors.append(exc)
+
+            threads = [threading.Thread(target=worker, args=(n,)) for n in range(number_of_threads)]
+            start = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            throughput[number_of_threads] = len(results) / (time.perf_counter() - start)
+
+            assert errors == []
+            assert len(results) == number_of_threads * requests_per_thread
+            assert all(result.is_submittable() for result in results)
+            assert all(result.get_verified_field('message') == VerificationResult.FIELD_VALID for result in results)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    for number_of_threads, verifications_per_second in throughput.items():
+        record_property('verifications_per_second_%d_threads' % number_of_threads, round(verifications_per_second, 1))
+
+    # More threads must not make the shared client substantially slower than a single thread.
+    assert min(throughput.values()) >= throughput[1] * 0.5
+
+def test_verify_submission_with_form_schema(requests_mock):
+    form_data = {
+        'name': 'John Example',
+        'email[]': ['john@example.com'],
+        'message': "Line 1\r\nLine 2"
+    }
+
+    requests_mock.post('http://test.local/api/v1/verification/verify', json={
+        'valid': False,
+        'issues': []
+    }, status_code=200)
+
+    api_client = Client('http://test.local', 'testPublicKey', 'testPrivateKey')
+    form_schema = api_client.register_form_schema(form_data)
+
+    assert type(form_schema) == FormSchema
+
+    api_client.verify_submission(dict(form_data), 'submitToken', 'validationToken')
+
+    request_data = json.loads(requests_mock.last_request.text)
+    prepared_form_data = RequestHelper('testPublicKey', 'testPrivateKey').prepare_form_data(dict(form_data))
+
+    assert request_data['formData'] == prepared_form_data
+    assert list(request_data['formData'].keys()) == list(prepared_form_data.keys())
+
+def test_register_conflicting_form_schema():
+    api_client = Client('http://test.local', 'testPublicKey', 'testPrivateKey')
+
+    form_schema = api_client.register_form_schema({'name': 'John Example', 'address': {'city': 'Example City'}})
+    api_client.register_form_schema({'name': 'Jane Example', 'address': {'city': 'Other City'}})
+
+    with pytest.raises(MosparoException) as exc:
+        api_client.register_form_schema({'name': 'John Example', 'address': {'street': 'Example Street'}})
 
+    assert 'A form schema with the same fields but a different structure is already registered.' in str(exc.value)
+    assert api_client._form_schemas[form_schema.key].has_same_fields(form_schema) is True
@@ -0,0 +1,106 @@
+import pytest
+from mosparo_api_client import FormSchema, MosparoException, RequestHelper
+
+publicKey = 'publicKey'
+privateKey = 'privateKey'
+
+sample = {
+    '_mosparo_submitToken': 'submitToken',
+    '_mosparo_validationToken': 'validationToken',
+    'name': 'Test Tester',
+    'address': {
+        'street': 'Teststreet',
+        'number': 123,
+        'details': {
+            'note': 'Note'
+        }
+    },
+    'valid': False,
+    'email[]': [
+        'test@example.com'
+    ],
+    'data': {}
+}
+
+def test_prepare_form_data():
+    formSchema = FormSchema(sample)
+    reqHelp = RequestHelper(publicKey, privateKey)
+
+    data = {
+        '_mosparo_submitToken': 'otherSubmitToken',
+        '_mosparo_validationToken': 'otherValidationToken',
+        'name': "Test\r\nTester",
+        'address': {
+            'street': "Teststreet\r\r\n1",
+            'number': 12.5,
+            'details': {
+                'note': "Note\r\r\r\n"
+            }
+        },
+        'valid': True,
+        'email[]': [
+            'test@example.com',
+            "test2@example.com\r\r\n"
+        ],
+        'data': {}
+    }
+
+    prepared = formSchema.prepare_form_data(data)
+
+    assert prepared == reqHelp.prepare_form_data(dict(data))
+    assert list(prepared.keys()) == ['address', 'data', 'email', 'name', 'valid']
+    assert reqHelp.to_json(prepared) == reqHelp.to_json(reqHelp.prepare_form_data(dict(data)))
+    assert '_mosparo_submitToken' in data
+
+def test_prepare_form_data_mismatch():
+    formSchema = FormSchema(sample)
+
+    data = dict(sample)
+    data['other'] = 'value'
+    assert formSchema.prepare_form_data(data) is None
+
+    data = dict(sample)
+    del data['name']
+    data['nam'] = 'value'
+    assert formSchema.prepare_form_data(data) is None
+
+    data = dict(sample)
+    data['name'] = ['Test Tester']
+    assert formSchema.prepare_form_data(data) is None
+
+    data = dict(sample)
+    data['address'] = {'street': 'Teststreet'}
+    assert formSchema.prepare_form_data(data) is None
+
+    data = dict(sample)
+    data['name'] = None
+    assert formSchema.prepare_form_data(data) is None
+
+def test_create_key():
+    assert FormSchema.create_key(sample) == frozenset(['name', 'address', 'valid', 'email[]', 'data'])
+    assert FormSchema(sample).key == FormSchema.create_key(sample)
+
+def test_has_same_fields():
+    assert FormSchema({'name': 'a', 'address': {'city': 'b'}}).has_same_fields(
+        FormSchema({'name': 'c', 'address': {'city': 'd'}})
+    ) is True
+    assert FormSchema({'name': 'a', 'address': {'city': 'b'}}).has_same_fields(
+        FormSchema({'name': 'a', 'address': {'street': 'b'}})
+    ) is False
+
+def test_compile_invalid_sample():
+    with pytest.raises(MosparoException):
+        FormSchema({'email': 'test@example.com', 'email[]': ['test@example.com']})
+
+    with pytest.raises(MosparoException):
+        FormSchema({'name': None})
+
+    with pytest.raises(MosparoException):
+        FormSchema({'list': [{'name': 'Test Tester'}]})
+
+def test_request_helper_with_form_schemas():
+    formSchema = FormSchema(sample)
+    reqHelp = RequestHelper(publicKey, privateKey, form_schemas={formSchema.key: formSchema})
+
+    assert reqHelp.prepare_form_data(dict(sample)) == RequestHelper(publicKey, privateKey).prepare_form_data(dict(sample))
+    assert reqHelp.prepare_form_data({'name': 'Test Tester'}) == RequestHelper(publicKey, privateKey).prepare_form_data({'name': 'Test Tester'})
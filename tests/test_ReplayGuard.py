@@ -0,0 +1,62 @@
+import time
+
+from mosparo_api_client import ReplayGuard, VerificationResult
+
+def test_lookup_unknown_token():
+    guard = ReplayGuard()
+
+    assert guard.lookup('submitToken', 'validationToken') is None
+    assert guard.get_hits() == 0
+    assert guard.get_misses() == 1
+
+def test_remember_submittable_result():
+    guard = ReplayGuard()
+
+    guard.remember('submitToken', 'validationToken', VerificationResult(True, True, {'name': VerificationResult.FIELD_VALID}, []))
+    result = guard.lookup('submitToken', 'validationToken')
+
+    assert result.is_submittable() is False
+    assert result.is_valid() is False
+    assert result.get_issues()[0]['message'] == ReplayGuard.REPLAY_ISSUE_MESSAGE
+    assert guard.get_hits() == 1
+    assert guard.get_size() == 1
+
+def test_remember_not_submittable_result():
+    guard = ReplayGuard()
+    issues = [{'message': 'Validation failed.'}]
+
+    guard.remember('submitToken', 'validationToken', VerificationResult(False, False, {}, issues))
+    result = guard.lookup('submitToken', 'validationToken')
+
+    assert result.is_submittable() is False
+    assert result.get_issues() == issues
+
+def test_max_entries():
+    guard = ReplayGuard(max_entries=2)
+
+    guard.remember('token1', 'validationToken', VerificationResult(False, False, {}, []))
+    guard.remember('token2', 'validationToken', VerificationResult(False, False, {}, []))
+    guard.remember('token3', 'validationToken', VerificationResult(False, False, {}, []))
+
+    assert guard.get_size() == 2
+    assert guard.get_evictions() == 1
+    assert guard.lookup('token1', 'validationToken') is None
+    assert guard.lookup('token3', 'validationToken') is not None
+
+def test_ttl():
+    guard = ReplayGuard(ttl=0.01)
+
+    guard.remember('submitToken', 'validationToken', VerificationResult(False, False, {}, []))
+    time.sleep(0.02)
+
+    assert guard.lookup('submitToken', 'validationToken') is None
+    assert guard.get_size() == 0
+    assert guard.get_evictions() == 0
+
+def test_lookup_other_validation_token():
+    guard = ReplayGuard()
+
+    guard.remember('submitToken', 'validationToken', VerificationResult(False, False, {}, []))
+
+    assert guard.lookup('submitToken', 'otherValidationToken') is None
+    assert guard.lookup('submitToken', 'validationToken') is not None
@@ -1,4 +1,4 @@
-from mosparo_api_client import RequestHelper
+from mosparo_api_client import RequestHelper, RequestProfiler
 
 publicKey = 'publicKey'
 privateKey = 'privateKey'
@@ -107,3 +107,52 @@ def test_create_form_data_hmac_hash():
     }
 
     assert '408f7cfd222dcf2369c8c1655df2f8de489858e23d9e100233a5b09e748fd360' == reqHelp.create_form_data_hmac_hash(data)
+
+def test_prepare_form_data_with_profiler():
+    profiler = RequestProfiler()
+    reqHelp = RequestHelper(publicKey, privateKey, profiler)
+
+    data = {
+        'name': 'Test Tester',
+        'address': {
+            'street': 'Teststreet',
+            'number': 123
+        },
+        'email[]': [
+            'test@example.com',
+            'test2@example.com'
+        ]
+    }
+
+    assert RequestHelper(publicKey, privateKey).prepare_form_data(dict(data)) == reqHelp.prepare_form_data(dict(data))
+
+    record = profiler.export()[0]
+
+    assert record['method'] == 'prepare_form_data'
+    assert record['nodes'] == 8
+    assert record['leaves'] == 5
+    assert record['leaf_bytes'] == 11 + 10 + 3 + 16 + 17
+    assert record['depth'] == 2
+    assert record['total_time'] >= record['normalization_time'] + record['hashing_time']
+
+def test_create_form_data_hmac_hash_with_profiler():
+    profiler = RequestProfiler()
+    reqHelp = RequestHelper(publicKey, privateKey, profiler)
+
+    data = {'name': 'Test Tester'}
+
+    assert RequestHelper(publicKey, privateKey).create_form_data_hmac_hash(data) == reqHelp.create_form_data_hmac_hash(data)
+
+    record = profiler.export()[0]
+
+    assert record['method'] == 'create_form_data_hmac_hash'
+    assert record['serialized_bytes'] == len('{"name":"Test Tester"}')
+
+def test_prepare_form_data_with_sampling_profiler():
+    profiler = RequestProfiler(sample_rate=2)
+    reqHelp = RequestHelper(publicKey, privateKey, profiler)
+
+    for i in range(4):
+        reqHelp.prepare_form_data({'name': 'Test Tester'})
+
+    assert len(profiler.export()) == 2
@@ -0,0 +1,52 @@
+import pytest
+from mosparo_api_client import RequestProfiler
+
+def test_should_sample():
+    profiler = RequestProfiler(sample_rate=3)
+
+    samples = [profiler.should_sample('prepare_form_data') for i in range(6)]
+
+    assert samples == [False, False, True, False, False, True]
+    assert profiler.get_number_of_calls() == 6
+
+def test_should_sample_counts_methods_separately():
+    profiler = RequestProfiler(sample_rate=2)
+
+    samples = []
+    for i in range(2):
+        samples.append(profiler.should_sample('prepare_form_data'))
+        samples.append(profiler.should_sample('create_form_data_hmac_hash'))
+
+    assert samples == [False, False, True, True]
+    assert profiler.get_number_of_calls('prepare_form_data') == 2
+    assert profiler.get_number_of_calls() == 4
+
+def test_invalid_sample_rate():
+    with pytest.raises(ValueError):
+        RequestProfiler(sample_rate=0)
+
+def test_create_record():
+    profiler = RequestProfiler()
+
+    record = profiler.create_record('prepare_form_data')
+
+    assert record['method'] == 'prepare_form_data'
+    assert record['nodes'] == 0
+    assert record['total_time'] == 0.0
+
+def test_export():
+    profiler = RequestProfiler(max_records=2)
+
+    for i in range(3):
+        record = profiler.create_record('prepare_form_data')
+        record['nodes'] = i
+        profiler.add_record(record)
+
+    records = profiler.export()
+
+    assert [record['nodes'] for record in records] == [1, 2]
+
+    records[0]['nodes'] = 10
+
+    assert profiler.export(clear=True)[0]['nodes'] == 1
+    assert profiler.export() == []
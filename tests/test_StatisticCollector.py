@@ -0,0 +1,140 @@
+from datetime import date, timedelta
+
+from mosparo_api_client import Client, StatisticCollector, StatisticResult
+
+def get_numbers_by_date(days):
+    today = date.today()
+    numbers_by_date = {}
+    for i in range(days, -1, -1):
+        numbers_by_date[(today - timedelta(days=i)).strftime('%Y-%m-%d')] = {
+            'numberOfValidSubmissions': 1,
+            'numberOfSpamSubmissions': 2
+        }
+
+    return numbers_by_date
+
+def test_collect_combines_time_ranges(requests_mock):
+    numbers_by_date = get_numbers_by_date(30)
+
+    requests_mock.get('http://test.local/api/v1/statistic/by-date', json={
+        'result': True,
+        'data': {
+            'numberOfValidSubmissions': 31,
+            'numberOfSpamSubmissions': 62,
+            'numbersByDate': numbers_by_date
+        }
+    }, status_code=200)
+
+    api_client = Client('http://test.local', 'testPublicKey', 'testPrivateKey')
+    queries = [
+        (api_client, 7 * 86400, None),
+        (api_client, 30 * 86400, None),
+        (api_client, 0, date.today() - timedelta(days=1)),
+    ]
+
+    results = StatisticCollector().collect(queries)
+
+    assert requests_mock.call_count == 1
+    assert requests_mock.last_request.qs == {'startdate': [(date.today() - timedelta(days=30)).strftime('%Y-%m-%d')]}
+
+    assert type(results[queries[0]]) == StatisticResult
+    assert results[queries[0]].get_number_of_valid_submissions() == 8
+    assert results[queries[0]].get_number_of_spam_submissions() == 16
+    assert len(results[queries[0]].get_numbers_by_date()) == 8
+    assert results[queries[1]].get_number_of_valid_submissions() == 31
+    assert results[queries[1]].get_numbers_by_date() == numbers_by_date
+    assert results[queries[2]].get_number_of_valid_submissions() == 2
+
+def test_collect_multiple_projects(requests_mock):
+    requests_mock.get('http://project1.local/api/v1/statistic/by-date', json={
+        'result': True,
+        'data': {
+            'numberOfValidSubmissions': 1,
+            'numberOfSpamSubmissions': 2,
+            'numbersByDate': get_numbers_by_date(0)
+        }
+    }, status_code=200)
+    requests_mock.get('http://project2.local/api/v1/statistic/by-date', json={
+        'result': True,
+        'data': {
+            'numberOfValidSubmissions': 0,
+            'numberOfSpamSubmissions': 0,
+            'numbersByDate': []
+        }
+    }, status_code=200)
+
+    api_client1 = Client('http://project1.local', 'testPublicKey1', 'testPrivateKey1')
+    api_client2 = Client('http://project2.local', 'testPublicKey2', 'testPrivateKey2')
+    queries = [
+        (api_client1, 0, None),
+        (api_client2, 86400, None),
+        (api_client2, 0, date.today()),
+    ]
+
+    results = StatisticCollector(max_workers=2).collect(queries)
+
+    assert requests_mock.call_count == 2
+    assert results[queries[0]].get_number_of_spam_submissions() == 2
+    assert results[queries[1]].get_number_of_valid_submissions() == 0
+    assert results[queries[2]].get_numbers_by_date() == {}
+
+def test_collect_sends_single_time_range_unchanged(requests_mock):
+    requests_mock.get('http://project1.local/api/v1/statistic/by-date', json={
+        'result': True,
+        'data': {
+            'numberOfValidSubmissions': 1,
+            'numberOfSpamSubmissions': 2,
+            'numbersByDate': get_numbers_by_date(0)
+        }
+    }, status_code=200)
+    requests_mock.get('http://project2.local/api/v1/statistic/by-date', json={
+        'result': True,
+        'data': {
+            'numberOfValidSubmissions': 3,
+            'numberOfSpamSubmissions': 4,
+            'numbersByDate': get_numbers_by_date(0)
+        }
+    }, status_code=200)
+
+    api_client1 = Client('http://project1.local', 'testPublicKey1', 'testPrivateKey1')
+    api_client2 = Client('http://project2.local', 'testPublicKey2', 'testPrivateKey2')
+    queries = [
+        (api_client1, 3600, None),
+        (api_client1, 3600, None),
+        (api_client2, 7 * 86400, None),
+    ]
+
+    results = StatisticCollector().collect(queries)
+
+    assert requests_mock.call_count == 2
+    assert sorted(request.qs['range'] for request in requests_mock.request_history) == [['3600'], ['604800']]
+    assert all('startdate' not in request.qs for request in requests_mock.request_history)
+    assert results[queries[0]].get_number_of_valid_submissions() == 1
+    assert results[queries[2]].get_number_of_valid_submissions() == 3
+
+def test_collect_sends_time_range_with_start_date_unchanged(requests_mock):
+    requests_mock.get('http://test.local/api/v1/statistic/by-date', json={
+        'result': True,
+        'data': {
+            'numberOfValidSubmissions': 1,
+            'numberOfSpamSubmissions': 2,
+            'numbersByDate': get_numbers_by_date(0)
+        }
+    }, status_code=200)
+
+    api_client = Client('http://test.local', 'testPublicKey', 'testPrivateKey')
+    start_date = date.today() - timedelta(days=3)
+    queries = [
+        (api_client, 86400, start_date),
+        (api_client, 7 * 86400, None),
+        (api_client, 0, date.today()),
+    ]
+
+    results = StatisticCollector(max_workers=1).collect(queries)
+
+    assert requests_mock.call_count == 2
+    assert requests_mock.request_history[0].qs == {'range': ['86400'], 'startdate': [start_date.strftime('%Y-%m-%d')]}
+    assert requests_mock.request_history[1].qs == {
+        'startdate': [(date.today() - timedelta(days=7)).strftime('%Y-%m-%d')]
+    }
+    assert results[queries[0]].get_number_of_valid_submissions() == 1
@@ -0,0 +1,200 @@
+import threading
+
+import pytest
+import requests
+from mosparo_api_client import Client, RequestHelper, VerificationQueue, VerificationResult
+
+public_key = 'testPublicKey'
+private_key = 'testPrivateKey'
+submit_token = 'submitToken'
+validation_token = 'validationToken'
+
+def get_verification_signature(form_data):
+    request_helper = RequestHelper(public_key, private_key)
+
+    prepared_form_data = request_helper.prepare_form_data(dict(form_data))
+    form_signature = request_helper.create_form_data_hmac_hash(prepared_form_data)
+    validation_signature = request_helper.create_hmac_hash(validation_token)
+
+    return request_helper.create_hmac_hash(validation_signature + form_signature)
+
+def test_enqueue_and_process(requests_mock, tmp_path):
+    form_data = {'name': 'John Example'}
+    results = []
+
+    requests_mock.post('http://test.local/api/v1/verification/verify', exc=requests.exceptions.ConnectionError)
+
+    api_client = Client('http://test.local', public_key, private_key)
+    queue = VerificationQueue(api_client, str(tmp_path / 'queue.sqlite'), lambda queue_id, result: results.append((queue_id, result)))
+
+    queue_id = queue.enqueue(dict(form_data), submit_token, validation_token)
+
+    assert queue.process() == 0
+    assert queue.get_size() == 1
+    assert results == []
+
+    requests_mock.post('http://test.local/api/v1/verification/verify', json={
+        'valid': True,
+        'verificationSignature': get_verification_signature(form_data),
+        'verifiedFields': {'name': VerificationResult.FIELD_VALID},
+        'issues': []
+    }, status_code=200)
+
+    assert queue.process() == 1
+    assert queue.get_size() == 0
+    assert results[0][0] == queue_id
+    assert results[0][1].is_submittable() is True
+    assert results[0][1].get_verified_field('name') == VerificationResult.FIELD_VALID
+
+    queue.close()
+
+def test_queue_is_persistent(requests_mock, tmp_path):
+    path = str(tmp_path / 'queue.sqlite')
+    api_client = Client('http://test.local', public_key, private_key)
+
+    queue = VerificationQueue(api_client, path, lambda queue_id, result: None)
+    queue.enqueue({'name': 'John Example'}, submit_token, validation_token)
+    queue.close()
+
+    queue = VerificationQueue(api_client, path, lambda queue_id, result: None)
+
+    assert queue.get_size() == 1
+
+    queue.close()
+
+def test_process_error_response(requests_mock, tmp_path):
+    results = []
+
+    requests_mock.post('http://test.local/api/v1/verification/verify', text='')
+
+    api_client = Client('http://test.local', public_key, private_key)
+    queue = VerificationQueue(api_client, str(tmp_path / 'queue.sqlite'), lambda queue_id, result: results.append(result))
+    queue.enqueue({'name': 'John Example'}, submit_token, validation_token)
+
+    assert queue.process() == 1
+    assert queue.get_size() == 0
+    assert results[0].is_submittable() is False
+    assert results[0].get_issues()[0]['message'] == 'Response from API invalid.'
+
+    queue.close()
+
+@pytest.mark.parametrize('status_code, text', [(502, '<html><body>Bad Gateway</body></html>'), (503, '')])
+def test_process_server_error(requests_mock, tmp_path, status_code, text):
+    form_data = {'name': 'John Example'}
+    results = []
+
+    requests_mock.post('http://test.local/api/v1/verification/verify', text=text, status_code=status_code)
+
+    api_client = Client('http://test.local', public_key, private_key)
+    queue = VerificationQueue(api_client, str(tmp_path / 'queue.sqlite'), lambda queue_id, result: results.append(result))
+    queue.enqueue(dict(form_data), submit_token, validation_token)
+
+    assert queue.process() == 0
+    assert queue.get_size() == 1
+    assert results == []
+
+    requests_mock.post('http://test.local/api/v1/verification/verify', json={
+        'valid': True,
+        'verificationSignature': get_verification_signature(form_data),
+        'verifiedFields': {'name': VerificationResult.FIELD_VALID},
+        'issues': []
+    }, status_code=200)
+
+    assert queue.process() == 1
+    assert queue.get_size() == 0
+    assert results[0].is_submittable() is True
+
+    queue.close()
+
+def test_background_worker(requests_mock, tmp_path):
+    form_data = {'name': 'John Example'}
+    processed = threading.Event()
+    results = []
+
+    def callback(queue_id, result):
+        results.append(result)
+        if len(results) == 3:
+            processed.set()
+
+    requests_mock.post('http://test.local/api/v1/verification/verify', json={
+        'valid': True,
+        'verificationSignature': get_verification_signature(form_data),
+        'verifiedFields': {'name': VerificationResult.FIELD_VALID},
+        'issues': []
+    }, status_code=200)
+
+    api_client = Client('http://test.local', public_key, private_key)
+    queue = VerificationQueue(api_client, str(tmp_path / 'queue.sqlite'), callback, concurrency=2)
+    queue.start()
+
+    for i in range(3):
+        queue.enqueue(dict(form_data), submit_token, validation_token)
+
+    assert processed.wait(5) is True
+    assert all(result.is_submittable() for result in results)
+
+    queue.close()
+
+def test_process_callback_error(requests_mock, tmp_path):
+    form_data = {'name': 'John Example'}
+    results = []
+    failures = ['database down']
+
+    def callback(queue_id, result):
+        if failures:
+            raise RuntimeError(failures.pop())
+
+        results.append((queue_id, result))
+
+    requests_mock.post('http://test.local/api/v1/verification/verify', json={
+        'valid': True,
+        'verificationSignature': get_verification_signature(form_data),
+        'verifiedFields': {'name': VerificationResult.FIELD_VALID},
+        'issues': []
+    }, status_code=200)
+
+    api_client = Client('http://test.local', public_key, private_key)
+    queue = VerificationQueue(api_client, str(tmp_path / 'queue.sqlite'), callback, concurrency=1)
+    first_queue_id = queue.enqueue(dict(form_data), submit_token, validation_token)
+    second_queue_id = queue.enqueue(dict(form_data), submit_token, validation_token)
+
+    assert queue.process() == 1
+    assert queue.get_size() == 1
+    assert results[0][0] == second_queue_id
+
+    assert queue.process() == 1
+    assert queue.get_size() == 0
+    assert requests_mock.call_count == 2
+    assert results[1][0] == first_queue_id
+    assert results[1][1].is_submittable() is True
+    assert results[1][1].get_verified_field('name') == VerificationResult.FIELD_VALID
+
+    queue.close()
+
+def test_stop_with_timeout_keeps_running_worker(requests_mock, tmp_path):
+    release = threading.Event()
+    called = threading.Event()
+
+    def callback(queue_id, result):
+        called.set()
+        release.wait(5)
+
+    requests_mock.post('http://test.local/api/v1/verification/verify', json={'valid': False}, status_code=200)
+
+    api_client = Client('http://test.local', public_key, private_key)
+    queue = VerificationQueue(api_client, str(tmp_path / 'queue.sqlite'), callback)
+    queue.enqueue({'name': 'John Example'}, submit_token, validation_token)
+    queue.start()
+
+    assert called.wait(5) is True
+
+    worker = queue._worker
+    queue.stop(timeout=0.05)
+    queue.start()
+
+    assert queue._worker is worker
+
+    release.set()
+    queue.close()
+
+    assert queue._worker is None